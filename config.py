@@ -1,4 +1,5 @@
 import os
+from functools import lru_cache
 from version import __version__
 
 class Config:
@@ -9,15 +10,40 @@ class Config:
     def __repr__(self):
         return f"Config({self.__dict__})"
 
+@lru_cache(maxsize=None)
+def get_env(env_var, default=None):
+    """
+    Reads an environment variable, each variable is only looked up once per process.
+    Use get_env.cache_clear() if the environment is changed afterwards.
+    """
+    return os.environ.get(env_var, default)
+
+def get_int_env(env_var, default):
+    """
+    Reads an integer environment variable, failing with a clear error for any other value.
+    """
+    value = get_env(env_var)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(f'{env_var} must be an integer, got "{value}"') from None
+
 def ask_dry_mode():
     # Check environment variable first for non-interactive mode
-    env_dry_run = os.getenv("JIRA_MIGRATION_DRY_RUN")
+    env_dry_run = get_env("JIRA_MIGRATION_DRY_RUN")
     if env_dry_run is not None:
         return env_dry_run.lower() in ('true', 'yes', '1', 'y')
     
     reply = input("\n\nDry-run? (nothing created in GitHub) [Y/n]: ").strip().lower()
     return (reply != "n")
 
+def _prompt_text(prompt, default):
+    if default is not None:
+        return f'{prompt} [default "{default}"]: '
+    return f'{prompt}: '
+
 def load_config(specs):
     """
     specs = [
@@ -26,23 +52,11 @@ def load_config(specs):
     ]
     Returns a Config instance with attributes based on specs.
     """
-    values = {}
-
-    for attr, env_var, prompt, default in specs:
-        # Env var lookup
-        value = os.getenv(env_var)
-
-        if not value:
-            # Build prompt string
-            text = prompt
-            if default is not None:
-                text += f' [default "{default}"]'
-            text += ": "
-
-            user_value = input(text).strip()
-            value = user_value or default
-
-        values[attr] = value
+    # Env var lookup first, only prompt for the missing ones
+    values = {
+        attr: get_env(env_var) or input(_prompt_text(prompt, default)).strip() or default
+        for attr, env_var, prompt, default in specs
+    }
 
     # Add version
     values["version"] = __version__
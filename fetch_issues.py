@@ -1,67 +1,164 @@
 #!/usr/bin/env python3
 
 import os
+import shutil
 import urllib.parse
-# noinspection PyUnresolvedReferences
-from lxml import etree, objectify
+from lxml import etree
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from math import ceil
 
-jira_server = os.getenv('JIRA_MIGRATION_JIRA_URL', 'https://issues.jenkins.io')
-jql_query = os.getenv('JIRA_MIGRATION_JQL_QUERY')
-max_results = int(os.getenv('JIRA_MIGRATION_JQL_MAX_RESULTS', 1000))
+from config import get_env, get_int_env
+from version import __version__
+
 file_path = 'jira_output'
+request_timeout = (10, 120)
+# Stock jira.search.views.max.limit, tried first when a larger page size is refused
+jira_default_max_limit = 1000
+
 
-try:
-    os.makedirs(file_path)
-except FileExistsError:
-    # directory already exists
-    pass
+def create_session(max_workers):
+    """
+    Session reusing the same connection for every page (keep-alive), retrying transient errors.
+    Keeps one connection per fetch worker.
+    """
+    session = requests.Session()
+    session.mount('https://', HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=max_workers,
+        max_retries=Retry(total=5, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+    ))
+    session.headers.update({
+        'Accept': 'application/xml',
+        # XML compresses very well, requests transparently decompresses it
+        'Accept-Encoding': 'gzip, deflate',
+        'User-Agent': f'jira-issues-importer/{__version__}'
+    })
+    return session
 
-encoded_query = urllib.parse.quote(jql_query)
-pager = 0
 
+def page_url(search_url, pager, page_size):
+    return f'{search_url}&tempMax={page_size}&pager/start={pager}'
 
-def fetch_total_results():
+
+def fetch_total_results(session, search_url):
     """
     Load one result from query to see how many results there will be to calculate pagination.
     """
-    global url, response, total_results
-    url = f'{jira_server}/sr/jira.issueviews:searchrequest-xml/temp/SearchRequest.xml?jqlQuery={encoded_query}&tempMax=1&pager/start=1'
-    response = requests.get(url)
+    count = 0
+    with session.get(page_url(search_url, 1, 1), timeout=request_timeout, stream=True) as response:
+        if (response.status_code == 400):
+            print(f'Error fetching data from Jira, status code: {response.status_code}')
+            print(response.text)
+            exit(1)
 
-    if (response.status_code == 400):
-        print(f'Error fetching data from Jira, status code: {response.status_code}')
-        print(response.text)
-        exit(1)
-    result = objectify.fromstring(response.text)
+        # Only the <issue total="..."/> element is needed, stop parsing as soon as it's reached
+        response.raw.decode_content = True
+        for _, elem in etree.iterparse(response.raw, events=('start',)):
+            if elem.tag == 'issue' and elem.get('total') is not None:
+                count = int(elem.get('total'))
+                break
 
-    count = int(result.channel.issue.attrib['total'])
     if count == 0:
         print('No results found for the given JQL query.')
         exit(1)
     return count
 
 
-total_results = fetch_total_results()
-total_pages = ceil(total_results / max_results)
+def fetch_page_range(page_file):
+    """
+    Returns the (start, end) range announced by the <issue> element of a saved page, or None.
+    """
+    for _, elem in etree.iterparse(page_file, events=('start',), huge_tree=True):
+        if elem.tag == 'issue' and elem.get('end') is not None:
+            return int(elem.get('start')), int(elem.get('end'))
+    return None
+
+
+def save_page(pager, response):
+    """
+    Stream a page to disk by chunks so it's never fully held in memory,
+    Jira already serves indented XML so it's saved as is.
+    """
+    page_file = f'{file_path}/result-{pager}.xml'
+    response.raw.decode_content = True
+    with open(page_file, 'wb') as doc:
+        shutil.copyfileobj(response.raw, doc, 64 * 1024)
+    return page_file
+
+
+def fetch_first_page(session, search_url, page_size, total_results):
+    """
+    Fetch the first page with as many results as possible.
+    Jira refuses requests above its jira.search.views.max.limit setting (HTTP 400),
+    and silently caps the others to its jira.search.views.default.max setting.
+    A refused page size is retried with the stock limit first, then halved.
+    Returns the page size actually applied by the server.
+    """
+    print('Fetching page 1')
+    response = session.get(page_url(search_url, 0, page_size), timeout=request_timeout, stream=True)
+    while response.status_code == 400 and page_size > 1:
+        response.close()
+        page_size = jira_default_max_limit if page_size > jira_default_max_limit else page_size // 2
+        print(f'Page size refused by Jira, retrying with {page_size} results per page')
+        response = session.get(page_url(search_url, 0, page_size), timeout=request_timeout, stream=True)
+    with response:
+        response.raise_for_status()
+        page_file = save_page(0, response)
+
+    page_range = fetch_page_range(page_file)
+    if page_range is not None and page_range[1] < total_results:
+        page_size = max(page_range[1] - page_range[0], 1)
+    return page_size
+
 
-while pager < total_results:
-    page_number = ceil(pager / max_results + 1)
+def fetch_page(session, search_url, page_size, total_pages, pager):
+    """
+    Fetch one page of results, starting at the given offset, and save it.
+    """
+    page_number = ceil(pager / page_size + 1)
     print(f'Fetching page {page_number}, out of {total_pages}')
-    url = f'{jira_server}/sr/jira.issueviews:searchrequest-xml/temp/SearchRequest.xml?jqlQuery={encoded_query}&tempMax={max_results}&pager/start={pager}'
-    response = requests.get(url)
-    root = objectify.fromstring(response.text)
+    with session.get(page_url(search_url, pager, page_size), timeout=request_timeout, stream=True) as response:
+        response.raise_for_status()
+        save_page(pager, response)
+
+
+def main():
+    jira_server = get_env('JIRA_MIGRATION_JIRA_URL', 'https://issues.jenkins.io')
+    jql_query = get_env('JIRA_MIGRATION_JQL_QUERY')
+    max_results = max(get_int_env('JIRA_MIGRATION_JQL_MAX_RESULTS', 5000), 1)
+    max_workers = max(get_int_env('JIRA_MIGRATION_JQL_FETCH_WORKERS', 8), 1)
+
+    os.makedirs(file_path, exist_ok=True)
+
+    encoded_query = urllib.parse.quote(jql_query)
+    search_url = f'{jira_server}/sr/jira.issueviews:searchrequest-xml/temp/SearchRequest.xml?jqlQuery={encoded_query}'
+
+    with create_session(max_workers) as session:
+        total_results = fetch_total_results(session, search_url)
+
+        # Request everything at once when possible, the first page tells the real page size
+        page_size = fetch_first_page(session, search_url, min(total_results, max_results), total_results)
+        total_pages = ceil(total_results / page_size)
+
+        # Remaining pages are independent, fetch them concurrently through the shared session
+        offsets = list(range(page_size, total_results, page_size))
+        if offsets:
+            with ThreadPoolExecutor(max_workers=min(max_workers, len(offsets))) as executor:
+                list(executor.map(partial(fetch_page, session, search_url, page_size, total_pages), offsets))
+
+    print('Complete')
 
-    with open(f'{file_path}/result-{pager}.xml', 'wb') as doc:
-        doc.write(etree.tostring(root, pretty_print=True))
-    pager += max_results
+    print(
+        '\n\n'
+        'Before running main.py, you should execute ./concatenate-xml-results.sh script\n'
+        'then ./retrieve-watchers-and-remotelinks.sh (or ./retrieve-remotelinks.sh if you don\'t have permissions to see watchers)\n'
+    )
 
-print('Complete')
 
-print(
-    '\n\n'
-    'Before running main.py, you should execute ./concatenate-xml-results.sh script\n'
-    'then ./retrieve-watchers-and-remotelinks.sh (or ./retrieve-remotelinks.sh if you don\'t have permissions to see watchers)\n'
-)
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,22 @@
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 import json
-import copy
+import itertools
+import random
 import re
+import threading
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from config import get_env, get_int_env
 from utils import fetch_labels_mapping, fetch_allowed_labels, convert_label, get_github_search_or_redirect_url_from_jira_key
 
 class FakeResponse:
@@ -21,11 +33,41 @@ class Importer:
     _PLACEHOLDER_PREFIX = "@PSTART"
     _PLACEHOLDER_SUFFIX = "@PEND"
     _DEFAULT_TIME_OUT = 120.0
+    # Imports usually take a few seconds: the first status check waits as long as before,
+    # the later ones back off so slow imports don't use up the API rate limit
+    _STATUS_POLL_INITIAL_DELAY = 3.0
+    _STATUS_POLL_MAX_DELAY = 30.0
+    _GRAPHQL_URL = 'https://api.github.com/graphql'
+    _MILESTONES_QUERY = '''
+        query($owner: String!, $repo: String!, $cursor: String) {
+          repository(owner: $owner, name: $repo) {
+            milestones(first: 100, after: $cursor) {
+              nodes { title number }
+              pageInfo { endCursor hasNextPage }
+            }
+          }
+        }
+    '''
+    # Issue fields converted to comments, with their relationship type, in the order the comments are added
+    _RELATIONSHIP_TYPES = (
+        ('duplicates', 'duplicates'),
+        ('is-duplicated-by', 'is_duplicated_by'),
+        ('is-related-to', 'relates_to'),
+        ('depends-on', 'depends_on'),
+        ('blocks', 'blocks')
+    )
+    _ETAG_CACHE = '.jira_migration_cache.json'
+    # Background dry-run writes waited for before submitting more, so their contents don't pile up in memory
+    _DRY_RUN_MAX_PENDING_WRITES = 16
 
     def __init__(self, project):
         self.project = project
         self.jira_to_github_txt_mapping = f'jira-keys-to-github-id_{self.project.current_datetime}.txt'
         self.jira_to_complete_github_txt_mapping = f'jira-keys-to-github-id-for-external-use_{self.project.current_datetime}.txt'
+        # Text mapping files, kept open during import_issues
+        self._jira_to_github_txt_file = None
+        self._jira_to_complete_github_txt_file = None
+        self._txt_mapping_lock = threading.Lock()
         self.github_api_url = f'https://api.github.com/repos/{self.project.config.github_account}/{self.project.config.github_repo}'
         self.jira_issue_replace_patterns = {
             'https://issues.jenkins.io/browse/%s%s' % (self.project.name, r'-(\d+)'): r'\1',
@@ -35,8 +77,30 @@ class Importer:
             'Accept': 'application/vnd.github.golden-comet-preview+json',
             'Authorization': f'token {self.project.config.github_pat}'
         }
-        self._dry_run_issue_counter = -1
+        # Jira links pattern, compiled once as it's applied to every issue and comment body:
+        # full Jira URLs like https://issues.jenkins.io/browse/INFRA-123 (excluding "no-jira-link-rewrite" links)
+        # or project keys like INFRA-123, matched in a single pass
+        project_key = rf'{re.escape(self.project.name)}-\d+'
+        self._jira_link_re = re.compile(
+            rf'(?<!<a class="no-jira-link-rewrite" href="){re.escape(self.project.jiraBaseUrl)}/browse/(?P<full>{project_key})'
+            rf'|(?P<key>{project_key})'
+        )
+        # Keep-alive connections shared by all the GitHub API calls, retrying transient gateway errors
+        # (urllib3 doesn't retry POST by default, so an issue import is never sent twice)
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        self.session.mount('https://', HTTPAdapter(
+            pool_connections=4,
+            pool_maxsize=20,
+            max_retries=Retry(total=5, backoff_factor=1, status_forcelist=[502, 503, 504])
+        ))
+        # Negative fake issue ids for dry-run, next() on a count is safe across import threads
+        self._dry_run_issue_ids = itertools.count(-1, -1)
         self._dry_run_index_data = []
+        # Dry-run files are written in the background during import_issues
+        self._dry_run_io_pool = None
+        self._dry_run_writes = deque()
+        self._dry_run_writes_lock = threading.Lock()
 
     def import_milestones(self):
         """
@@ -44,68 +108,86 @@ class Importer:
         """
         milestone_url = self.github_api_url + '/milestones'
         print('Importing milestones...', milestone_url)
-        print
 
         if self.project.config.dry_run:
             print('Dry-run: no milestone import to GitHub')
 
         # Check existing first
-        existing = list()
-
-        def get_milestone_list(url):
-            return requests.get(url, headers=self.headers,
-                                timeout=Importer._DEFAULT_TIME_OUT)
-
-        def get_next_page_url(url):
-            return url.replace('<', '').replace('>', '').replace('; rel="next"', '')
+        existing = set()
+
+        def get_milestone_list(cursor):
+            """
+            Returns the milestones of the page and the cursor of the next page, if any
+            """
+            content = self._gql(Importer._MILESTONES_QUERY, {
+                'owner': self.project.config.github_account,
+                'repo': self.project.config.github_repo,
+                'cursor': cursor
+            })
+            connection = ((content.get('data') or {}).get('repository') or {}).get('milestones')
+            if connection is None:
+                print('Failure listing milestones', content.get('errors'))
+                return [], None
+            page_info = connection['pageInfo']
+            return connection['nodes'], page_info['endCursor'] if page_info['hasNextPage'] else None
 
         milestone_pages = list()
-        ms = get_milestone_list(milestone_url + '?state=all')
-        milestone_pages.append(ms.json())
-
-        if 'Link' in ms.headers:
-            links = ms.headers['Link'].split(',')
-            nextPageUrl = get_next_page_url(links[0])
-
-            while nextPageUrl is not None:
-                time.sleep(1)
-                nextPageUrl = None
-
-                for l in links:
-                    if 'rel="next"' in l:
-                        nextPageUrl = get_next_page_url(l)
+        ms_json, cursor = get_milestone_list(None)
+        milestone_pages.append(ms_json)
 
-                if nextPageUrl is not None:
-                    ms = get_milestone_list(nextPageUrl)
-                    links = ms.headers['Link'].split(',')
-                    milestone_pages.append(ms.json())
+        # Follow the pagination cursor, _gql pauses if the rate limit is exhausted
+        while cursor:
+            ms_json, cursor = get_milestone_list(cursor)
+            milestone_pages.append(ms_json)
 
+        milestones = self.project.get_milestones()
         for ms_json in milestone_pages:
             for m in ms_json:
-                print(self.project.get_milestones().keys())
                 try:
-                    if m['title'] in self.project.get_milestones().keys():
-                        self.project.get_milestones()[m['title']] = m['number']
+                    if m['title'] in milestones:
+                        milestones[m['title']] = m['number']
                         print(m['title'], 'found')
-                        existing.append(m['title'])
+                        existing.add(m['title'])
                 except TypeError:
                     pass
 
         # Export new ones
-        for mkey in self.project.get_milestones().keys():
+        for mkey in milestones.keys():
             if mkey in existing:
                 continue
 
             data = {'title': mkey}
             if not self.project.config.dry_run:
-                r = requests.post(milestone_url, json=data, headers=self.headers, timeout=Importer._DEFAULT_TIME_OUT)
+                r = self.session.post(milestone_url, json=data, timeout=Importer._DEFAULT_TIME_OUT)
 
                 # overwrite histogram data with the actual milestone id now
                 if r.status_code == 201:
                     content = r.json()
-                    self.project.get_milestones()[mkey] = content['number']
+                    milestones[mkey] = content['number']
                     print(mkey)
 
+    def _gql(self, query, variables):
+        """
+        Runs a query against GitHub GraphQL API and returns the decoded response
+        """
+        r = self.session.post(Importer._GRAPHQL_URL, json={'query': query, 'variables': variables},
+                              timeout=Importer._DEFAULT_TIME_OUT)
+        Importer._wait_for_rate_limit_reset(r)
+        return r.json()
+
+    @staticmethod
+    def _wait_for_rate_limit_reset(response):
+        """
+        Sleeps until GitHub rate limit resets if the response says no request is remaining
+        """
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            reset = response.headers.get('X-RateLimit-Reset', '')
+            if reset.isdigit():
+                wait = int(reset) - time.time()
+                if wait > 0:
+                    print(f'GitHub rate limit exhausted, waiting {int(wait)}s for its reset')
+                    time.sleep(wait)
+
     def import_labels(self, colour_selector):
         """
         Imports the gathered project components and labels as labels into GitHub 
@@ -117,55 +199,99 @@ class Importer:
         if self.project.config.dry_run:
             print('Dry-run: no label import to GitHub')
 
+        dry_run = self.project.config.dry_run
+        components = self.project.get_components()
+        labels_mapping = self.project.labels_mapping
+        approved_labels = self.project.approved_labels
+        include_component = get_env('JIRA_MIGRATION_INCLUDE_COMPONENT_IN_LABELS', 'true') == 'true'
+
+        labels = []
         for lkey in self.project.get_all_labels().keys():
 
             prefixed_lkey = lkey.lower()
             # prefix component
-            if os.getenv('JIRA_MIGRATION_INCLUDE_COMPONENT_IN_LABELS', 'true') == 'true':
-                if lkey in self.project.get_components().keys():
-                    prefixed_lkey = 'jira-component:' + prefixed_lkey
+            if include_component and lkey in components:
+                prefixed_lkey = 'jira-component:' + prefixed_lkey
 
-            prefixed_lkey = convert_label(prefixed_lkey, self.project.labels_mapping, self.project.approved_labels)
+            prefixed_lkey = convert_label(prefixed_lkey, labels_mapping, approved_labels)
             if prefixed_lkey is None:
                 continue
 
             data = {'name': prefixed_lkey,
                     'color': colour_selector.get_colour(lkey)}
-                    
-            if not self.project.config.dry_run:
-                r = requests.post(label_url, json=data, headers=self.headers, timeout=Importer._DEFAULT_TIME_OUT)
-            if r.status_code == 201 or self.project.config.dry_run:
+            labels.append((lkey, prefixed_lkey, data))
+
+        if dry_run:
+            for lkey, prefixed_lkey, data in labels:
                 print(lkey + '->' + prefixed_lkey)
+            return
+
+        # Skip the labels already there (GitHub label names are case insensitive)
+        existing = self._get_existing_labels(label_url)
+        for lkey, prefixed_lkey, data in labels:
+            if prefixed_lkey.lower() in existing:
+                print(lkey + '->' + prefixed_lkey, 'found')
+        labels = [label for label in labels if label[1].lower() not in existing]
+
+        def post_label(label):
+            return self.session.post(label_url, json=label[2], timeout=Importer._DEFAULT_TIME_OUT)
+
+        # Labels are created one at a time by default, as GitHub advises against creating content concurrently,
+        # JIRA_MIGRATION_LABEL_IMPORT_CONCURRENCY > 1 sends that many label creations at the same time
+        workers = max(get_int_env('JIRA_MIGRATION_LABEL_IMPORT_CONCURRENCY', 1), 1)
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for (lkey, prefixed_lkey, data), r in zip(labels, executor.map(post_label, labels)):
+                if r.status_code == 201:
+                    print(lkey + '->' + prefixed_lkey)
+                else:
+                    print('Failure importing label ' + prefixed_lkey,
+                          r.status_code, r.content, r.headers)
+
+    def _get_existing_labels(self, label_url):
+        """
+        Returns the lowercased names of the labels already in the GitHub repository.
+        Pages are kept with their ETag between runs and revalidated with If-None-Match,
+        unchanged pages come back as 304, which don't count against GitHub rate limit.
+        """
+        try:
+            with open(Importer._ETAG_CACHE, encoding='utf-8') as f:
+                etag_cache = json.load(f)
+        except (OSError, ValueError):
+            etag_cache = {}
+
+        existing = set()
+        url = label_url + '?per_page=100'
+        while url:
+            cached = etag_cache.get(url)
+            headers = {'If-None-Match': cached['etag']} if cached else None
+            r = self.session.get(url, headers=headers, timeout=Importer._DEFAULT_TIME_OUT)
+            if r.status_code == 304:
+                body, next_url = cached['body'], cached['next']
+            elif r.status_code == 200:
+                body = r.json()
+                next_url = r.links['next']['url'] if 'next' in r.links else None
+                if r.headers.get('ETag'):
+                    etag_cache[url] = {'etag': r.headers['ETag'], 'body': body, 'next': next_url}
             else:
-                print('Failure importing label ' + prefixed_lkey,
-                      r.status_code, r.content, r.headers)
+                print('Failure listing existing labels', r.status_code, r.content)
+                break
+            existing.update(label['name'].lower() for label in body)
+            url = next_url
+
+        with open(Importer._ETAG_CACHE, 'w', encoding='utf-8') as f:
+            json.dump(etag_cache, f)
+        return existing
 
     def _find_jira_links(self, text):
         """
         Finds all Jira links in the given text.
-        Returns a list of unique Jira links found.
+        Returns a set of unique Jira links found.
         """
-        if not text:
-            return []
-
-        jira_links = []
-
-        # Pattern 1: Full Jira URLs like https://issues.jenkins.io/browse/INFRA-123
-        # excluding "no-jira-link-rewrite" links
-        full_url_pattern = (
-            rf'(?<!<a class="no-jira-link-rewrite" href=")'
-            rf'{self.project.jiraBaseUrl}/browse/({self.project.name}-\d+)'
-        )
-        full_urls = re.findall(full_url_pattern, text)
-        jira_links.extend(full_urls)
+        # Both alternatives contain the project key, a substring check is much cheaper than the regex scan
+        if not text or self.project.name not in text:
+            return set()
 
-        # Pattern 2: Project key format like INFRA-123
-        project_key_pattern = self.project.name + r'-(\d+)'
-        project_keys = re.findall(project_key_pattern, text)
-        jira_links.extend([f'{self.project.name}-{key}' for key in project_keys])
-
-        # Return unique links
-        return list(set(jira_links))
+        return {m.group('full') or m.group('key') for m in self._jira_link_re.finditer(text)}
 
     def _format_issue_as_markdown(self, issue, comments, jira_key):
         """
@@ -239,7 +365,12 @@ class Importer:
         md.append("| Jira Key | Title | State | Labels | Created | Closed |\n")
         md.append("|----------|-------|-------|--------|---------|--------|\n")
 
+        # Statistics are counted in the same pass as the table rows
+        states = Counter()
+        all_labels = Counter()
         for issue_data in self._dry_run_index_data:
+            states[issue_data['state']] += 1
+            all_labels.update(issue_data['labels'])
             jira_key = issue_data['jira_key']
             title = issue_data['title'].replace('|', '\\|')  # Escape pipes in title
             state = issue_data['state']
@@ -253,20 +384,12 @@ class Importer:
 
         # Add summary statistics
         md.append("\n## Statistics\n\n")
-        open_issues = sum(1 for d in self._dry_run_index_data if d['state'] == 'open')
-        closed_issues = sum(1 for d in self._dry_run_index_data if d['state'] == 'closed')
-        md.append(f"- **Open:** {open_issues}\n")
-        md.append(f"- **Closed:** {closed_issues}\n")
-
-        # Count labels
-        all_labels = {}
-        for issue_data in self._dry_run_index_data:
-            for label in issue_data['labels']:
-                all_labels[label] = all_labels.get(label, 0) + 1
+        md.append(f"- **Open:** {states['open']}\n")
+        md.append(f"- **Closed:** {states['closed']}\n")
 
         if all_labels:
             md.append("\n## Labels\n\n")
-            for label, count in sorted(all_labels.items(), key=lambda x: x[1], reverse=True):
+            for label, count in all_labels.most_common():
                 md.append(f"- **{label}:** {count}\n")
 
         return ''.join(md)
@@ -284,95 +407,107 @@ class Importer:
         if self.project.config.dry_run:
             print('Dry-run: no issue import to GitHub')
 
-        count = 0
+        # Issues are imported one by one by default, so GitHub issue numbers follow the Jira order
+        # and a failed run can be resumed from the failing index.
+        # With JIRA_MIGRATION_IMPORT_CONCURRENCY > 1, several imports are in flight at the same time,
+        # at most twice that many issues are submitted ahead so a failure stops the import early.
+        concurrency = max(get_int_env('JIRA_MIGRATION_IMPORT_CONCURRENCY', 1), 1)
+        max_pending = concurrency * 2
+
         issue_mappings = []
         github_issue_ids = {}
-
-        for issue in self.project.get_issues():
-            if start_from_count > count:
-                count += 1
-                continue
-
-            print("Index = ", count)
-
-            if 'milestone_name' in issue:
-                issue['milestone'] = self.project.get_milestones()[
-                    issue['milestone_name']]
-                del issue['milestone_name']
-
-            original_issue_comments = issue['comments']
-            issue_watchers_count = int(issue['_watchers_count'])
-            issue_votes_count = int(issue['_votes_count'])
-
-            self.convert_relationships_to_comments(issue)
-
-            issue_comments = issue['comments']
-            del issue['comments']
-            comments = []
-            for comment in issue_comments:
-                comments.append(
-                    dict((k, self._replace_jira_with_github_id(v)) for k, v in comment.items()))
-
-            self.import_issue_with_comments(issue, comments)
-
-            # Storing if issue and/or comments have Jira links in order to facilitate post-process
-            issue_mapping = copy.deepcopy(issue)
-            issue_mapping['watchers_count'] = issue_watchers_count
-            issue_mapping['has_watchers'] = 'true' if issue_watchers_count > 0 else 'false'
-            issue_mapping['votes_count'] = issue_votes_count
-            issue_mapping['has_votes'] = 'true' if issue_votes_count > 0 else 'false'
-            issue_mapping['jira_links'] = []
-            issue_mapping['jira_links_in_body'] = []
-            issue_mapping['jira_links_in_comments'] = []
-            issue_mapping['has_jira_links'] = []
-            issue_mapping['has_jira_links_in_body'] = []
-
-            issue_links = self._find_jira_links(issue_mapping['body'])
-            del issue_mapping['body']
-            if issue_links:
-                issue_mapping['jira_links'] = issue_links
-                issue_mapping['jira_links_in_body'] = issue_links
-                issue_mapping['has_jira_links'] = 'true'
-                issue_mapping['has_jira_links_in_body'] = 'true'
-
-            for comment in original_issue_comments:
-                comment_links = self._find_jira_links(comment['body'])
-                if comment_links:
-                    issue_mapping['jira_links'].extend(comment_links)
-                    issue_mapping['jira_links_in_comments'].extend(comment_links)
-                    issue_mapping['has_jira_links'] = 'true'
-                    issue_mapping['has_jira_links_in_comments'] = 'true'
-            issue_mapping['jira_links'] = list(set(issue_mapping['jira_links']))
-            issue_mapping['jira_links_in_body'] = list(set(issue_mapping['jira_links_in_body']))
-            issue_mapping['jira_links_in_comments'] = list(set(issue_mapping['jira_links_in_comments']))
-
-            issue_mappings.append(issue_mapping)
-            github_issue_ids[issue_mapping['jira_issue_key']] = issue_mapping['github_issue_id']
-
-            count += 1
+        pending = deque()
+        milestones = self.project.get_milestones()
+
+        def add_issue_mapping(mapping):
+            github_issue_ids[mapping['jira_issue_key']] = mapping['github_issue_id']
+            issue_mappings.append(mapping)
+
+        def collect_oldest_pending():
+            # Mappings are collected in the issues order, whatever the order imports complete in
+            index, future, issue, original_issue_comments, issue_watchers_count, issue_votes_count = pending.popleft()
+            try:
+                future.result()
+            except Exception:
+                print(f'Import failed for issue at index {index}')
+                # Later issues may have been imported meanwhile, let the running imports end to report them
+                executor.shutdown(wait=True, cancel_futures=True)
+                imported_after = [later_index for later_index, later_future, *_ in pending
+                                  if not later_future.cancelled() and later_future.exception() is None]
+                if imported_after:
+                    print(f'Issues at index {", ".join(map(str, imported_after))} were imported to GitHub too '
+                          f'(they are in the text mappings only), resuming from index {index} would import them again')
+                raise
+            add_issue_mapping(self._issue_mapping(issue, original_issue_comments, issue_watchers_count, issue_votes_count))
+
+        # Line buffered: each mapping line is on disk as soon as its issue exists on GitHub, even if the run is killed
+        self._jira_to_github_txt_file = open(self.jira_to_github_txt_mapping, 'a', buffering=1)
+        self._jira_to_complete_github_txt_file = open(self.jira_to_complete_github_txt_mapping, 'a', buffering=1)
+        executor = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
+        if self.project.config.dry_run:
+            self._dry_run_io_pool = ThreadPoolExecutor(max_workers=4)
+        try:
+            # Issues before start_from_count were imported by a previous run
+            issues = itertools.islice(self.project.get_issues(), start_from_count, None)
+            for count, issue in enumerate(issues, start=start_from_count):
+                print("Index = ", count)
+
+                if 'milestone_name' in issue:
+                    issue['milestone'] = milestones[issue['milestone_name']]
+                    del issue['milestone_name']
+
+                original_issue_comments = issue['comments']
+                issue_watchers_count = int(issue['_watchers_count'])
+                issue_votes_count = int(issue['_votes_count'])
+
+                self.convert_relationships_to_comments(issue)
+
+                # Jira ids are not rewritten in comments (see _replace_jira_with_github_id), they are sent as they are
+                comments = issue['comments']
+                del issue['comments']
+
+                if executor is None:
+                    try:
+                        self.import_issue_with_comments(issue, comments)
+                    except Exception:
+                        print(f'Import failed for issue at index {count}')
+                        raise
+                    add_issue_mapping(self._issue_mapping(issue, original_issue_comments, issue_watchers_count, issue_votes_count))
+                else:
+                    future = executor.submit(self.import_issue_with_comments, issue, comments)
+                    pending.append((count, future, issue, original_issue_comments, issue_watchers_count, issue_votes_count))
+                    if len(pending) >= max_pending:
+                        collect_oldest_pending()
+
+            while pending:
+                collect_oldest_pending()
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=True, cancel_futures=True)
+            self._jira_to_github_txt_file.close()
+            self._jira_to_complete_github_txt_file.close()
+            if self._dry_run_io_pool is not None:
+                self._dry_run_io_pool.shutdown(wait=True)
+                self._dry_run_io_pool = None
+
+        # Surface any dry-run write error
+        while self._dry_run_writes:
+            self._dry_run_writes.popleft().result()
 
         # Find Jira links that have been imported and that can be rewritten in post-process
+        imported_keys = set(github_issue_ids)
         for mapping in issue_mappings:
             if mapping['has_jira_links']:
-                mapping['jira_links_imported'] = []
-                mapping['jira_links_in_body_imported'] = []
-                mapping['jira_links_in_comments_imported'] = []
-                for jira_key in mapping['jira_links_in_body']:
-                    if jira_key in github_issue_ids:
-                        mapping['jira_links_imported'].append(jira_key)
-                        mapping['jira_links_in_body_imported'].append(jira_key)
-                for jira_key in mapping['jira_links_in_comments']:
-                    if jira_key in github_issue_ids:
-                        mapping['jira_links_imported'].append(jira_key)
-                        mapping['jira_links_in_comments_imported'].append(jira_key)
-                mapping['jira_links_imported'] = list(set(mapping['jira_links_imported']))
-                mapping['jira_links_in_body_imported'] = list(set(mapping['jira_links_in_body_imported']))
-                mapping['jira_links_in_comments_imported'] = list(set(mapping['jira_links_in_comments_imported']))
+                body_imported = imported_keys.intersection(mapping['jira_links_in_body'])
+                comments_imported = imported_keys.intersection(mapping['jira_links_in_comments'])
+                mapping['jira_links_imported'] = list(body_imported | comments_imported)
+                mapping['jira_links_in_body_imported'] = list(body_imported)
+                mapping['jira_links_in_comments_imported'] = list(comments_imported)
 
         # Save collected data to JSON after all issues are imported
         json_mapping = f'jira-to-github-mapping_{self.project.current_datetime}.json'
         with open(json_mapping, 'w', encoding='utf-8') as f:
-            json.dump(issue_mappings, f, indent=2, ensure_ascii=False)
+            f.write(Importer._json_dumps(issue_mappings, indent=True))
         print(json_mapping + ' saved.')
         print('Text mapping: ' + self.jira_to_github_txt_mapping)
 
@@ -384,6 +519,50 @@ class Importer:
                 f.write(index_md)
             print(f'Dry-run: saved index to {index_filename}')
 
+    @staticmethod
+    def _json_dumps(data, indent=False):
+        """
+        Serializes to a JSON string, indented by 2 spaces if asked, with orjson when available.
+        """
+        if orjson is not None:
+            return orjson.dumps(data, option=orjson.OPT_INDENT_2 if indent else None).decode('utf-8')
+        return json.dumps(data, indent=2 if indent else None, ensure_ascii=False)
+
+    def _issue_mapping(self, issue, original_issue_comments, issue_watchers_count, issue_votes_count):
+        """
+        Builds the mapping entry of an imported issue, stored in the JSON mapping file.
+        """
+        # Storing if issue and/or comments have Jira links in order to facilitate post-process
+        # Shallow copy: the issue was already uploaded and isn't modified anymore
+        issue_mapping = {k: v for k, v in issue.items() if k != 'body' and not k.startswith('_')}
+        issue_mapping['watchers_count'] = issue_watchers_count
+        issue_mapping['has_watchers'] = 'true' if issue_watchers_count > 0 else 'false'
+        issue_mapping['votes_count'] = issue_votes_count
+        issue_mapping['has_votes'] = 'true' if issue_votes_count > 0 else 'false'
+        issue_mapping['jira_links'] = []
+        issue_mapping['jira_links_in_body'] = []
+        issue_mapping['jira_links_in_comments'] = []
+        issue_mapping['has_jira_links'] = []
+        issue_mapping['has_jira_links_in_body'] = []
+
+        body_links = self._find_jira_links(issue['body'])
+        if body_links:
+            issue_mapping['has_jira_links'] = 'true'
+            issue_mapping['has_jira_links_in_body'] = 'true'
+
+        comments_links = set()
+        for comment in original_issue_comments:
+            comment_links = self._find_jira_links(comment['body'])
+            if comment_links:
+                comments_links.update(comment_links)
+                issue_mapping['has_jira_links'] = 'true'
+                issue_mapping['has_jira_links_in_comments'] = 'true'
+        issue_mapping['jira_links'] = list(body_links | comments_links)
+        issue_mapping['jira_links_in_body'] = list(body_links)
+        issue_mapping['jira_links_in_comments'] = list(comments_links)
+
+        return issue_mapping
+
     def import_issue_with_comments(self, issue, comments):
         """
         Imports a single issue with its comments into GitHub.
@@ -395,8 +574,6 @@ class Importer:
         Then GitHub is pulled in a loop until the issue import is completed.
         Finally the issue github is noted.    
         """
-        print('Issue ', issue['key'])
-        print('Labels', issue['labels'])
         jira_key = issue['key']
         del issue['key']
 
@@ -409,10 +586,28 @@ class Importer:
 
         jira_gh = f"{jira_key}:{gh_issue_id}\n"
         jira_complete_gh = f"{jira_key}:{self.project.config.github_account}/{self.project.config.github_repo}#{gh_issue_id}\n"
-        with open(self.jira_to_github_txt_mapping, 'a') as f:
-            f.write(jira_gh)
-        with open(self.jira_to_complete_github_txt_mapping, 'a') as f:
-            f.write(jira_complete_gh)
+        with self._txt_mapping_lock:
+            self._jira_to_github_txt_file.write(jira_gh)
+            self._jira_to_complete_github_txt_file.write(jira_complete_gh)
+
+    @staticmethod
+    def _write_text_file(filename, content):
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(content)
+
+    def _write_dry_run_file(self, filename, content):
+        """
+        Writes a dry-run file in the background when import_issues is running, right away otherwise.
+        """
+        if self._dry_run_io_pool is None:
+            Importer._write_text_file(filename, content)
+        else:
+            with self._dry_run_writes_lock:
+                # Collect the finished writes, and wait for the oldest ones while too many are pending
+                while self._dry_run_writes and (self._dry_run_writes[0].done()
+                        or len(self._dry_run_writes) >= Importer._DRY_RUN_MAX_PENDING_WRITES):
+                    self._dry_run_writes.popleft().result()
+                self._dry_run_writes.append(self._dry_run_io_pool.submit(Importer._write_text_file, filename, content))
 
     def upload_github_issue(self, issue, comments, jira_key):
         """
@@ -420,11 +615,9 @@ class Importer:
         In dry-run mode, saves the issue data to a JSON file in the dry-run folder.
         """
         issue_url = self.github_api_url + '/import/issues'
-        # Delete keys starting with "_", only there for data gathering, not for issue upload
-        for key in list(issue):
-            if key.startswith('_'):
-                issue.pop(key)
-        issue_data = {'issue': issue, 'comments': comments}
+        # Leave out keys starting with "_", only there for data gathering, not for issue upload
+        issue_payload = {k: v for k, v in issue.items() if not k.startswith('_')}
+        issue_data = {'issue': issue_payload, 'comments': comments}
 
         if self.project.config.dry_run:
             # Create dry-run folder if it doesn't exist
@@ -432,16 +625,15 @@ class Importer:
             os.makedirs(dry_run_folder, exist_ok=True)
 
             # Save issue data to JSON file
+            # (serialized right away, the issue is updated once imported)
             json_filename = os.path.join(dry_run_folder, f'{jira_key}.json')
-            with open(json_filename, 'w', encoding='utf-8') as f:
-                json.dump(issue_data, f, indent=2, ensure_ascii=False)
+            self._write_dry_run_file(json_filename, Importer._json_dumps(issue_data, indent=True))
             print(f'Dry-run: saved issue data to {json_filename}')
 
             # Save issue as markdown file
             md_content = self._format_issue_as_markdown(issue, comments, jira_key)
             md_filename = os.path.join(dry_run_folder, f'{jira_key}.md')
-            with open(md_filename, 'w', encoding='utf-8') as f:
-                f.write(md_content)
+            self._write_dry_run_file(md_filename, md_content)
             print(f'Dry-run: saved issue markdown to {md_filename}')
 
             # Collect data for index
@@ -456,7 +648,7 @@ class Importer:
 
             return FakeResponse({'url': 'dry_run'})
 
-        response = requests.post(issue_url, json=issue_data, headers=self.headers,
+        response = self.session.post(issue_url, json=issue_data,
             timeout=Importer._DEFAULT_TIME_OUT)
         if response.status_code == 202:
             return response
@@ -476,17 +668,28 @@ class Importer:
         Check the status of a GitHub issue import.
         If the status is 'pending', it sleeps, then rechecks until the status is
         either 'imported' or 'failed'.
+        The first sleep matches the usual import time, the next ones grow exponentially (with jitter)
+        up to a cap, unless GitHub sends a Retry-After header.
+        Rate limited checks (403/429) are retried after the delay, or after the rate limit reset.
         """
         if self.project.config.dry_run:
-            fake_id = self._dry_run_issue_counter
-            self._dry_run_issue_counter += -1
+            fake_id = next(self._dry_run_issue_ids)
             return FakeResponse({'issue_url': f'dry_run/{fake_id}'})
 
+        delay = Importer._STATUS_POLL_INITIAL_DELAY
         while True:  # keep checking until status is something other than 'pending'
-            time.sleep(3)
-            response = requests.get(status_url, headers=self.headers, 
+            time.sleep(delay + random.uniform(0, 0.25))
+            response = self.session.get(status_url,
                 timeout=Importer._DEFAULT_TIME_OUT)
-            if response.status_code == 404:
+            retry_after = response.headers.get('Retry-After')
+            if retry_after is not None and retry_after.isdigit():
+                delay = int(retry_after)
+            else:
+                delay = min(delay * 1.5, Importer._STATUS_POLL_MAX_DELAY)
+            Importer._wait_for_rate_limit_reset(response)
+            if response.status_code in (404, 429):
+                continue
+            elif response.status_code == 403 and (retry_after is not None or response.headers.get('X-RateLimit-Remaining') == '0'):
                 continue
             elif response.status_code != 200:
                 raise RuntimeError(
@@ -513,16 +716,6 @@ class Importer:
         return response
 
     def convert_relationships_to_comments(self, issue):
-        duplicates = issue['duplicates']
-        is_duplicated_by = issue['is-duplicated-by']
-        relates_to = issue['is-related-to']
-        depends_on = issue['depends-on']
-        blocks = issue['blocks']
-        try:
-            epic_key = issue['epic-link']
-        except (AttributeError, KeyError):
-            epic_key = None
-
         def _comment_body(jira_key, relationship_type):
             a_url = get_github_search_or_redirect_url_from_jira_key(self.project, str(jira_key))
             return (
@@ -533,42 +726,22 @@ class Importer:
                 f'<i>[Original `{relationship_type}` from Jira: {a_url}]</i>\n'
             )
 
-        for jira_key in duplicates:
-            issue['comments'].append(
-                {"body": _comment_body(jira_key, 'duplicates')})
-
-        for jira_key in is_duplicated_by:
-            issue['comments'].append(
-                {"body": _comment_body(jira_key, 'is_duplicated_by')})
-
-        for jira_key in relates_to:
-            issue['comments'].append(
-                {"body": _comment_body(jira_key, 'relates_to')})
-
-        for jira_key in depends_on:
-            issue['comments'].append(
-                {"body": _comment_body(jira_key, 'depends_on')})
-
-        for jira_key in blocks:
-            issue['comments'].append(
-                {"body": _comment_body(jira_key, 'blocks')})
-
-        del issue['duplicates']
-        del issue['is-duplicated-by']
-        del issue['is-related-to']
-        del issue['depends-on']
-        del issue['blocks']
+        # Relationship fields are removed from the issue as their comments are added
+        issue['comments'].extend(
+            {"body": _comment_body(jira_key, relationship_type)}
+            for field, relationship_type in Importer._RELATIONSHIP_TYPES
+            for jira_key in issue.pop(field))
         try:
             del issue['epic-link']
         except KeyError:
             pass
 
     def _replace_jira_with_github_id(self, text):
-        result = text
+        # Disabled: Jira ids are kept as they are
         # for pattern, replacement in self.jira_issue_replace_patterns.items():
         #     result = re.sub(pattern, Importer._PLACEHOLDER_PREFIX +
         #                     replacement + Importer._PLACEHOLDER_SUFFIX, result)
-        return result
+        return text
 
     # def post_process_comments(self):
     #     """
@@ -1,14 +1,18 @@
 class LabelColourSelector:
+    _COLOURS = {
+        'jira-type:epic': 'ddf4dd',
+        'bug': 'ee4035'
+    }
+
     def __init__(self, project):
         self._project = project
 
     def get_colour(self, label):
-        if label == 'jira-type:epic':
-            return 'ddf4dd'
+        colour = LabelColourSelector._COLOURS.get(label)
+        if colour is not None:
+            return colour
         elif label.startswith('jira-type:'):
             return '7bc043'
-        elif label == 'bug':
-            return 'ee4035'
         # elif (label in self._project.get_components()): return 'fdf498'
         # elif (label.replace('component:', '') in self._project.get_components()): return 'fdf498'
         else:
@@ -6,7 +6,7 @@ import os.path
 from project import Project
 from importer import Importer
 from labelcolourselector import LabelColourSelector
-from utils import read_xml_files
+from utils import iter_xml_items
 from config import load_config
 from datetime import datetime
 
@@ -33,8 +33,6 @@ print(f"Jira Migration Tool - version {config.version}")
 if not config.hosted_artifact_org_repo:
     print('JIRA_MIGRATION_HOSTED_ARTIFACT_ORG_REPO is not set: no mapping files will be retrieved, no avatar will be rattached to issues or comments, and attachment links won\'t be replaced')
 
-all_xml_files = read_xml_files(config.file_names)
-
 print(
     f'Parameters taken in account:\n'
     f'- XML file(s):                 {config.file_names}\n'
@@ -56,9 +54,9 @@ if not start_from_issue:
 project = Project(config)
 project.load_mappings()
 
-for f in all_xml_files:
-    for item in f.channel.item:
-        project.add_item(item)
+# Issues are parsed one at a time and released once added to the project
+for item in iter_xml_items(config.file_names):
+    project.add_item(item)
 
 project.prettify()
 
@@ -1,17 +1,100 @@
+import functools
 import os
 from collections import defaultdict
-from html.entities import name2codepoint
+from datetime import datetime
+import html
+import html.entities
 from dateutil.parser import parse
 import re
+import string
 import requests
 import time
 
 from urllib.parse import quote
 
+from config import get_env
 from utils import fetch_labels_mapping, fetch_allowed_labels, fetch_hosted_mappings, fetch_remote_links, convert_label, proper_label_str, replace_jira_urls_with_redirection_service, replace_plain_jira_keys_with_links
 
 from version import __version__
 
+# Jira rendered HTML cleanup patterns, compiled once as they're applied to every issue and comment body
+# Named or numeric character references, only with their ending semicolon
+_HTML_ENTITY_RE = re.compile(r'&(#[0-9]+|#[xX][0-9a-fA-F]+|[A-Za-z][A-Za-z0-9]*);')
+# {code} and {noformat}, in a single pass as these blocks never nest
+_PREFORMATTED_PANEL_RE = re.compile(
+    r'<div class="code panel" style="border-width: 1px;"><div class="codeContent panelContent">\n<pre class="code-[^"]*">(?P<code>.*?)</pre>\n</div></div>'
+    r'|<div class="preformatted panel" style="border-width: 1px;"><div class="preformattedContent panelContent">\n<pre>(?P<noformat>.*?)</pre>\n</div></div>',
+    re.DOTALL)
+# {panel:title}
+_TITLED_PANEL_RE = re.compile(r'<div class="panel" style="border-width: 1px;"><div class="panelHeader" style="border-bottom-width: 1px;"><b>(.*?)</b></div><div class="panelContent">\s*(.*?)\s*</div></div>', re.DOTALL)
+# {panel}
+_PANEL_RE = re.compile(r'<div class="panel" style="border-width: 1px;"><div class="panelContent">\s*(.*?)\s*</div></div>', re.DOTALL)
+# Characters of a GitHub @mention
+_MENTION_CHARS = frozenset(string.ascii_letters + string.digits + '._-')
+
+# Lowercased Jira issue types to their GitHub label, other types get no label
+_JIRA_TYPE_MAPPING = {
+    'bug': 'bug',
+    'improvement': 'enhancement',
+    'new feature': 'enhancement',
+    'task': 'jira-type:task',
+    'story': 'jira-type:story',
+    'patch': 'jira-type:patch',
+    'epic': 'jira-type:epic'
+}
+
+def _escape_mentions(s):
+    """
+    Inserts a zero width space after each @ starting a mention.
+    A str.find scan is much faster than a regexp substitution, especially for texts without any @.
+    """
+    parts = []
+    start = 0
+    at = s.find('@')
+    while at != -1:
+        if s[at + 1:at + 2] in _MENTION_CHARS:
+            parts.append(s[start:at + 1])
+            parts.append('\u200B')
+            start = at + 1
+        at = s.find('@', at + 1)
+    if not parts:
+        return s
+    parts.append(s[start:])
+    return ''.join(parts)
+
+def _html_entity_replacement(m):
+    """
+    Decodes a character reference, unknown names are kept as they are.
+    html.unescape isn't applied to the whole text as it also decodes legacy names without semicolon (ex: &notification).
+    """
+    ref = m.group(1)
+    if ref[0] == '#':
+        return html.unescape(m.group(0))
+    return html.entities.html5.get(ref + ';', m.group(0))
+
+def _preformatted_panel_replacement(m):
+    if m.lastgroup == 'code':
+        # Handle {code}: need special handling as Jira insert HTML spans for {code} block content highlighting
+        return '\n<pre>\n' + m.group('code') + '</pre>'
+    # Handle {noformat}
+    return '\n\n```\n' + m.group('noformat') + '\n```'
+
+# Jira XML exports dates, ex: Mon, 3 Jan 2022 10:11:12 +0000
+_JIRA_DATE_FORMAT = '%a, %d %b %Y %H:%M:%S %z'
+
+@functools.lru_cache(maxsize=8192)
+def _timestamp_to_iso(timestamp):
+    """
+    Converts a Jira timestamp to ISO 8601, parsing the usual export format directly
+    and leaving any other one to dateutil.
+    Cached as the same timestamps come back for an issue and its synthetic comments.
+    """
+    try:
+        dt = datetime.strptime(timestamp, _JIRA_DATE_FORMAT)
+    except ValueError:
+        dt = parse(timestamp)
+    return dt.isoformat()
+
 class Project:
 
     def __init__(self, config):
@@ -21,6 +104,12 @@ class Project:
         self.current_datetime = config.current_datetime
         self.doneStatusCategoryId = config.jira_done_id
         self.jiraBaseUrl = config.jira_base_url
+        self._include_component_in_labels = get_env('JIRA_MIGRATION_INCLUDE_COMPONENT_IN_LABELS', 'true') == 'true'
+        # Pattern to match attachment or thumbnail URLs
+        self._attachment_url_re = re.compile(
+            rf'{self.jiraBaseUrl}/secure/(?:attachment|thumbnail)/(\d+)/(?:[^"]+)',
+            re.IGNORECASE
+        )
         self._project = {
             'Milestones': defaultdict(int),
             'Components': defaultdict(int),
@@ -50,11 +139,17 @@ class Project:
         self.jira_user_avatars = {}
         self.jira_attachments = {}
 
+        # Users author many issues and comments, their rendered name and avatar are only built once
+        self._username_and_avatar_cache = {}
+
     def load_mappings(self):
         """
         Delegate the fetching logic to utils.
         """
-        return fetch_hosted_mappings(self)
+        project = fetch_hosted_mappings(self)
+        # Usernames and avatars depend on the mappings
+        self._username_and_avatar_cache.clear()
+        return project
 
     def get_milestones(self):
         return self._project['Milestones']
@@ -103,9 +198,8 @@ class Project:
 
     def prettify(self):
         def hist(h):
-            for key in h.keys():
-                print(('%30s (%5d): ' + h[key] * '#') % (key, h[key]))
-            print
+            if h:
+                print('\n'.join('%30s (%5d): %s' % (key, count, '#' * count) for key, count in h.items()))
 
         print(self.name + ':\n  Milestones:')
         hist(self._project['Milestones'])
@@ -115,7 +209,6 @@ class Project:
         hist(self._project['Components'])
         print('  Labels:')
         hist(self._project['Labels'])
-        print
         print('Total Issues to Import: %d' % len(self._project['Issues']))
 
     def _projectFor(self, item):
@@ -127,7 +220,7 @@ class Project:
 
     def _append_item_to_project(self, item):
         # todo assignee
-        closed = str(item.statusCategory.get('id')) == self.doneStatusCategoryId
+        closed = item.statusCategory.get('id') == self.doneStatusCategoryId
         closed_at = ''
         if closed:
             try:
@@ -138,24 +231,33 @@ class Project:
         # retrieve jira components and labels as github labels (add 'imported-jira-issue' label by default)
         labels = ['imported-jira-issue']
         print(item)
-        for component in item.component:
-            if os.getenv('JIRA_MIGRATION_INCLUDE_COMPONENT_IN_LABELS', 'true') == 'true':
-                labels.append('component:' + proper_label_str(component.text[:40]))
+        # Components and labels texts are used several times below, collect them once
+        component_texts = [component.text for component in item.iterchildren('component')]
+        try:
+            label_texts = [label.text for label in item.labels.iterchildren('label')]
+        except AttributeError:
+            label_texts = []
+
+        if self._include_component_in_labels:
+            for component_text in component_texts:
+                labels.append('component:' + proper_label_str(component_text[:40]))
 
         labels.append(self._jira_type_mapping(item.type.text.lower()))
 
-        for label in item.labels.findall('label'):
-            converted_label = convert_label(proper_label_str(label.text), self.labels_mapping, self.approved_labels)
+        for label_text in label_texts:
+            converted_label = convert_label(proper_label_str(label_text), self.labels_mapping, self.approved_labels)
             if converted_label is not None:
                 labels.append(converted_label[:50])
 
-        labels = list(filter(None, set(labels))) # Unique labels, filter out None
+        labels = list(filter(None, dict.fromkeys(labels))) # Unique labels in their order, filter out None
 
         body = self._clean_html(item.description.text)
 
         # Apply Jira URL rewriting to the entire body
         body = replace_jira_urls_with_redirection_service(self, body)
         body = replace_plain_jira_keys_with_links(self, body)
+        # Pieces of the body, joined once complete
+        body_parts = [body]
 
         ## imported issue details block
         # metadata: original author & link
@@ -164,68 +266,64 @@ class Project:
         reporter = self._username_and_avatar(reporter_username)
         issue_url = item.link.text
         issue_title_without_key = item.title.text[item.title.text.index("]") + 2:len(item.title.text)]
-        body += f'\n\n---\n<details><summary><i>Originally reported by {reporter}, imported from: <a class="original-jira-link" href="{issue_url}" target="_blank">{issue_title_without_key}</a></i></summary>'
-        body += '\n<i><ul>'
+        body_parts.append(f'\n\n---\n<details><summary><i>Originally reported by {reporter}, imported from: <a class="original-jira-link" href="{issue_url}" target="_blank">{issue_title_without_key}</a></i></summary>')
+        body_parts.append('\n<i><ul>')
 
         # metadata: assignee
         if item.assignee != 'Unassigned':
             assignee_fullname = item.assignee.text
             assignee_username = self._proper_jirauser_username(item.assignee.get('username'))
             assignee = self._username_and_avatar(assignee_username)
-            body += '\n<li><b>assignee</b>: ' + assignee
+            body_parts.append('\n<li><b>assignee</b>: ' + assignee)
         else:
             assignee_username = ''
 
         # metadata: status
         try:
-            body += '\n<li><b>status</b>: ' + item.status
+            body_parts.append('\n<li><b>status</b>: ' + item.status)
         except AttributeError:
             pass
 
         # metadata: priority
         try:
             priority_txt = item.priority.text
-            body += '\n<li><b>priority</b>: ' + priority_txt
+            body_parts.append('\n<li><b>priority</b>: ' + priority_txt)
             labels.append('priority:' + proper_label_str(priority_txt))
         except AttributeError:
             pass
 
         # metadata: components
-        components_txt = ''
-        for component in item.component:
-            components_txt += ', ' + component.text if components_txt else component.text
+        components_txt = ', '.join(component_texts)
         if components_txt:
-            body += '\n<li><b>component(s)</b>: ' + components_txt
+            body_parts.append('\n<li><b>component(s)</b>: ' + components_txt)
 
         # metadata: labels
-        labels_txt = ''
-        for label in item.labels.findall('label'):
-            labels_txt += ', ' + label.text if labels_txt else label.text
+        labels_txt = ', '.join(label_texts)
         if labels_txt:
-            body += '\n<li><b>label(s)</b>: ' + labels_txt
+            body_parts.append('\n<li><b>label(s)</b>: ' + labels_txt)
 
         # metadata: resolution
         try:
             resolution_txt = item.resolution.text
-            body += '\n<li><b>resolution</b>: ' + resolution_txt
+            body_parts.append('\n<li><b>resolution</b>: ' + resolution_txt)
             labels.append('resolution:' + proper_label_str(resolution_txt))
         except AttributeError:
             pass
 
         # metadata: resolved
         try:
-            body += '\n<li><b>resolved</b>: ' + self._convert_to_iso(item.resolved.text)
+            body_parts.append('\n<li><b>resolved</b>: ' + self._convert_to_iso(item.resolved.text))
         except AttributeError:
             pass
-        body += '\n<li><b>votes</b>: ' + str(item.votes)
-        body += '\n<li><b>watchers</b>: ' + str(item.watches)
-        body += '\n<li><b>imported</b>: ' + self.current_datetime
-        body += '\n</ul></i>'
+        body_parts.append('\n<li><b>votes</b>: ' + str(item.votes))
+        body_parts.append('\n<li><b>watchers</b>: ' + str(item.watches))
+        body_parts.append('\n<li><b>imported</b>: ' + self.current_datetime)
+        body_parts.append('\n</ul></i>')
         if item.description.text is not None:
-            body += '\n<details><summary>Raw content of original issue</summary>\n\n<pre>\n' + item.description.text.replace('<br/>', '') + '</pre>\n</details>'
+            body_parts.append('\n<details><summary>Raw content of original issue</summary>\n\n<pre>\n' + item.description.text.replace('<br/>', '') + '</pre>\n</details>')
 
         ## End of issue details block
-        body += '\n</details>'
+        body_parts.append('\n</details>')
 
         # metadata: environment
         try:
@@ -237,7 +335,7 @@ class Project:
                 lines = [line for line in lines if line.replace('<br/>', '').strip() != '']
                 if len(lines) > 1:
                     environment_txt = '<details><summary><i>environment</i></summary>\n\n```\n' + '\n'.join(lines) + '\n```\n</details>'
-                body += '\n' + environment_txt
+                body_parts.append('\n' + environment_txt)
         except AttributeError:
             pass
 
@@ -245,7 +343,7 @@ class Project:
         try:
             attachments = []
             image_extensions = ['.png', '.jpg', '.jpeg', '.gif', '.bmp', '.svg']
-            for attachment in item.attachments.attachment:
+            for attachment in item.attachments.iterchildren('attachment'):
                 attachment_id = attachment.get('id')
                 attachment_name = attachment.get('name')
                 attachment_extension = os.path.splitext(attachment_name)[1].lower()
@@ -261,7 +359,7 @@ class Project:
                 attachments.append('\n- ' + attachment_txt)
             if len(attachments) > 0:
                 summary = str(len(attachments)) + ' attachments' if len(attachments) > 1 else '1 attachment'
-                body += '\n<details><summary><i>' + summary + '</i></summary>\n' + ''.join(attachments) + '\n</details>'
+                body_parts.append('\n<details><summary><i>' + summary + '</i></summary>\n' + ''.join(attachments) + '\n</details>')
         except AttributeError:
             pass
 
@@ -286,17 +384,17 @@ class Project:
         # Adding the reporter as "author" too in those references
         hidden_refs += f'\n<!-- [author={reporter_username}] -->'
         # components
-        for component in item.component:
-            hidden_refs += f'\n<!-- [jira_component={component.text}] -->'
+        for component_text in component_texts:
+            hidden_refs += f'\n<!-- [jira_component={component_text}] -->'
         # labels
-        for label in item.labels.findall('label'):
-            hidden_refs += f'\n<!-- [jira_label={label.text}] -->'
+        for label_text in label_texts:
+            hidden_refs += f'\n<!-- [jira_label={label_text}] -->'
 
         # Add version of the importer for future references
         hidden_refs += '\n<!-- [jira_issues_importer_version=' + self.version + '] -->'
 
         # Put hidden refs on top of body
-        body = hidden_refs + '\n\n' + body
+        body = hidden_refs + '\n\n' + ''.join(body_parts)
 
         # _ keys are only there for gathering import data
         self._project['Issues'].append({'title': item.title.text,
@@ -320,24 +418,10 @@ class Project:
             del self._project['Issues'][-1]['closed_at']
 
     def _jira_type_mapping(self, issue_type):
-        if issue_type == 'bug':
-            return 'bug'
-        if issue_type == 'improvement':
-            return 'enhancement'
-        if issue_type == 'new feature':
-            return 'enhancement'
-        if issue_type == 'task':
-            return 'jira-type:task'
-        if issue_type == 'story':
-            return 'jira-type:story'
-        if issue_type == 'patch':
-            return 'jira-type:patch'
-        if issue_type == 'epic':
-            return 'jira-type:epic'
+        return _JIRA_TYPE_MAPPING.get(issue_type)
 
     def _convert_to_iso(self, timestamp):
-        dt = parse(timestamp)
-        return dt.isoformat()
+        return _timestamp_to_iso(timestamp)
 
     def _add_milestone(self, item):
         try:
@@ -359,7 +443,7 @@ class Project:
             pass
         
         try:
-            for label in item.labels.label:
+            for label in item.labels.iterchildren('label'):
                 self._project['Labels'][label.text] += 1
                 tmp_l = label.text.trim()
                 if tmp_l == 'Bug':
@@ -382,7 +466,7 @@ class Project:
     def _add_subtasks(self, item):
         try:
             subtaskList = ''
-            for subtask in item.subtasks.subtask:
+            for subtask in item.subtasks.iterchildren('subtask'):
                 subtaskList = subtaskList + '- ' + subtask + '\n'
             if subtaskList != '':
                 print('-> subtaskList: ' + subtaskList)
@@ -407,12 +491,6 @@ class Project:
         if not self.hosted_artifact_base:
             return html  # nothing to rewrite
 
-        # Pattern to match attachment or thumbnail URLs
-        pattern = re.compile(
-            rf'{self.jiraBaseUrl}/secure/(?:attachment|thumbnail)/(\d+)/(?:[^"]+)',
-            re.IGNORECASE
-        )
-
         def repl(m):
             attachment_id = m.group(1)
             filename = attachment_map.get(attachment_id)
@@ -422,7 +500,7 @@ class Project:
                 return m.group(0)
             return 'https://raw.githubusercontent.com/' + quote(self.jira_attachments[attachment_id])
 
-        return pattern.sub(repl, html)
+        return self._attachment_url_re.sub(repl, html)
 
     def _add_comments(self, item):
 
@@ -430,13 +508,13 @@ class Project:
 
         attachment_map = {}
         try:
-            for att in item.attachments.attachment:
+            for att in item.attachments.iterchildren('attachment'):
                 attachment_map[att.get('id')] = att.get('name')
         except AttributeError:
             pass
 
         try:
-            for comment in item.comments.comment:
+            for comment in item.comments.iterchildren('comment'):
                 comment_id = comment.get('id')
                 comment_username = self._proper_jirauser_username(comment.get('author'))
                 comment_author = self._username_and_avatar(comment_username, 'for_comment')
@@ -495,8 +573,7 @@ class Project:
                 f'<!-- [synthetic_comment=remote_links] -->\n'
                 f'- _Remote link{plural} associated with this issue:_\n\n'
             )
-            for rl in links:
-                comment_body += f'\n  - {rl}'
+            comment_body += ''.join(f'\n  - {rl}' for rl in links)
 
             self._project["Issues"][-1]["comments"].append({
                 "created_at": self._convert_to_iso(item.created.text),
@@ -505,10 +582,10 @@ class Project:
 
     def _add_relationships(self, item):
         try:
-            for issuelinktype in item.issuelinks.issuelinktype:
-                for outwardlink in issuelinktype.outwardlinks:
-                    for issuelink in outwardlink.issuelink:
-                        for issuekey in issuelink.issuekey:
+            for issuelinktype in item.issuelinks.iterchildren('issuelinktype'):
+                for outwardlink in issuelinktype.iterchildren('outwardlinks'):
+                    for issuelink in outwardlink.iterchildren('issuelink'):
+                        for issuekey in issuelink.iterchildren('issuekey'):
                             tmp_outward = outwardlink.get("description").replace(' ', '-')
                             if tmp_outward in self._project['Issues'][-1]:
                                 self._project['Issues'][-1][tmp_outward].append(issuekey.text)
@@ -517,10 +594,10 @@ class Project:
         except KeyError:
             print('1. KeyError at ' + item.key.text)
         try:
-            for issuelinktype in item.issuelinks.issuelinktype:
-                for inwardlink in issuelinktype.inwardlinks:
-                    for issuelink in inwardlink.issuelink:
-                        for issuekey in issuelink.issuekey:
+            for issuelinktype in item.issuelinks.iterchildren('issuelinktype'):
+                for inwardlink in issuelinktype.iterchildren('inwardlinks'):
+                    for issuelink in inwardlink.iterchildren('issuelink'):
+                        for issuekey in issuelink.iterchildren('issuekey'):
                             tmp_inward = inwardlink.get("description").replace(' ', '-')
                             if tmp_inward in self._project['Issues'][-1]:
                                 self._project['Issues'][-1][tmp_inward].append(issuekey.text)
@@ -532,34 +609,37 @@ class Project:
         self._project['Issues'][-1]['epic-link'] = self._find_epic_link_key(item)
 
     def _find_epic_link_key(self, item):
-        for customfield in item.customfields.findall('customfield'):
+        for customfield in item.customfields.iterchildren('customfield'):
             if customfield.get('key') == 'com.pyxis.greenhopper.jira:gh-epic-link':
-                return customfield.customfieldvalues.customfieldvalue
+                # Text only: keeping the element would keep the whole item alive after it's cleared
+                return customfield.customfieldvalues.customfieldvalue.text
         return None
 
     def _htmlentitydecode(self, s):
         if s is None:
             return ''
         s = s.replace(' ' * 8, '')
-        return re.sub('&(%s);' % '|'.join(name2codepoint),
-                      lambda m: chr(name2codepoint[m.group(1)]), s)
+        if '&' not in s:
+            return s
+        return _HTML_ENTITY_RE.sub(_html_entity_replacement, s)
 
     def _clean_html(self, s):
         if s is None:
             return ''
         s = self._htmlentitydecode(s)
         # Cleanup of Jira specific markup rendered HTML with non-greedy multiline regexps
-        # Handle {code}: need special handling as Jira insert HTML spans for {code} block content highlighting
-        s = re.sub(r'<div class="code panel" style="border-width: 1px;"><div class="codeContent panelContent">\n<pre class="code-[^"]*">(.*?)</pre>\n</div></div>', r'\n<pre>\n\1</pre>', s, flags=re.DOTALL)
-        # Handle {noformat}
-        s = re.sub(r'<div class="preformatted panel" style="border-width: 1px;"><div class="preformattedContent panelContent">\n<pre>(.*?)</pre>\n</div></div>', r'\n\n```\n\1\n```', s, flags=re.DOTALL)
-        # Handle {panel:title}: processed first to avoid matching by the no-title pattern
-        s = re.sub(r'<div class="panel" style="border-width: 1px;"><div class="panelHeader" style="border-bottom-width: 1px;"><b>(.*?)</b></div><div class="panelContent">\s*(.*?)\s*</div></div>', r'\n\n<table><tr><td><b>\1</b></td></tr><tr><td>\2</td></tr></table>\n', s, flags=re.DOTALL)
-        # Handle {panel}
-        s = re.sub(r'<div class="panel" style="border-width: 1px;"><div class="panelContent">\s*(.*?)\s*</div></div>', r'\n\n<table><tr><td>\1</td></tr></table>\n', s, flags=re.DOTALL)
+        # Each regexp only runs when its panel class is present, most texts have none
+        # Handle {code} and {noformat}
+        if 'class="code panel"' in s or 'class="preformatted panel"' in s:
+            s = _PREFORMATTED_PANEL_RE.sub(_preformatted_panel_replacement, s)
+        if 'class="panel"' in s:
+            # Handle {panel:title}: processed first to avoid matching by the no-title pattern
+            s = _TITLED_PANEL_RE.sub(r'\n\n<table><tr><td><b>\1</b></td></tr><tr><td>\2</td></tr></table>\n', s)
+            # Handle {panel}
+            s = _PANEL_RE.sub(r'\n\n<table><tr><td>\1</td></tr></table>\n', s)
 
         # Escape @mentions to prevent unwanted mentions in GitHub
-        s = re.sub(r'@([A-Za-z0-9._-]+)', '@\u200B\\1', s)
+        s = _escape_mentions(s)
 
         return s
 
@@ -570,6 +650,13 @@ class Project:
 
     # In case JIRAUSER* proper usernames are not found
     def _username_and_avatar(self, name, for_comment = ''):
+        key = (name, for_comment)
+        result = self._username_and_avatar_cache.get(key)
+        if result is None:
+            result = self._username_and_avatar_cache[key] = self._build_username_and_avatar(name, for_comment)
+        return result
+
+    def _build_username_and_avatar(self, name, for_comment):
         username = self._proper_jirauser_username(name)
         avatar = ''
         # Retrieve avatars only if JIRA_MIGRATION_HOSTED_ARTIFACT_ORG_REPO is set
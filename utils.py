@@ -1,10 +1,11 @@
-from lxml import objectify
+from lxml import etree, objectify
 import os
-import glob
 import requests
 import re
 
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 
 def fetch_labels_mapping():
     with open('labels_mapping.txt') as file:
@@ -49,39 +50,54 @@ def fetch_hosted_mappings(project):
     else:
         os.makedirs(mapping_folder)
 
+    _download_mappings(project.hosted_artifact_base, mapping_folder, [
+        project.jira_fixed_username_filename,
+        project.jira_username_avatar_mapping_filename,
+        project.jira_attachments_filename
+    ], fresh)
+
     # Ex of line: JIRAUSER134221:hlemeur
-    project.jira_fixed_usernames = _download_mapping(project.hosted_artifact_base, mapping_folder, project.jira_fixed_username_filename, fresh)
+    project.jira_fixed_usernames = _parse_mapping(os.path.join(mapping_folder, project.jira_fixed_username_filename))
     # Ex of line: hlemeur:avatars/hlemeur.png
-    project.jira_user_avatars = _download_mapping(project.hosted_artifact_base, mapping_folder, project.jira_username_avatar_mapping_filename, fresh)
+    project.jira_user_avatars = _parse_mapping(os.path.join(mapping_folder, project.jira_username_avatar_mapping_filename))
     # Ex of line: 64966:jenkinsci/attachments-from-jira-issues-core-cli/refs/heads/main/attachments/64966/jenkins-build3.log
-    project.jira_attachments = _download_mapping(project.hosted_artifact_base, mapping_folder, project.jira_attachments_filename, fresh)
+    project.jira_attachments = _parse_mapping(os.path.join(mapping_folder, project.jira_attachments_filename))
 
     return project
 
-def _download_mapping(mapping_base_url, mapping_folder, mapping_filename, force = False):
+def _download_mappings(mapping_base_url, mapping_folder, mapping_filenames, force = False):
     """
-    Downloads one mapping file if necessary and returns a parsed dict.
+    Downloads the mapping files if necessary, concurrently over a shared keep-alive session.
     """
 
     folder_name = os.path.basename(mapping_folder)
 
-    url = f'{mapping_base_url}/{folder_name}/{mapping_filename}'
-    dest = os.path.join(mapping_folder, mapping_filename)
+    downloads = []
+    for mapping_filename in mapping_filenames:
+        url = f'{mapping_base_url}/{folder_name}/{mapping_filename}'
+        dest = os.path.join(mapping_folder, mapping_filename)
+
+        if force and os.path.exists(dest):
+            print(f'- Deleting existing {dest}')
+            os.remove(dest)
+
+        if not os.path.exists(dest):
+            print(f'- Downloading: {url}')
+            downloads.append((url, dest))
+        else:
+            print(f'- Using cached mapping: {dest}')
 
-    if force and os.path.exists(dest):
-        print(f'- Deleting existing {dest}')
-        os.remove(dest)
+    if not downloads:
+        return
 
-    if not os.path.exists(dest):
-        print(f'- Downloading: {url}')
-        r = requests.get(url)
+    def download(url, dest):
+        r = session.get(url, timeout=30)
         r.raise_for_status()
         with open(dest, "wb") as f:
             f.write(r.content)
-    else:
-        print(f'- Using cached mapping: {dest}')
 
-    return _parse_mapping(dest)
+    with requests.Session() as session, ThreadPoolExecutor(max_workers=len(downloads)) as executor:
+        list(executor.map(lambda d: download(*d), downloads))
 
 def _parse_mapping(path):
     mapping = {}
@@ -118,22 +134,37 @@ def convert_label(label, labels_mappings, approved_labels):
 def proper_label_str(label):
     return label.lower().strip().replace(' ', '-').replace("'", '')
 
-def read_xml_file(file_path):
-    with open(file_path) as file:
-        return objectify.fromstring(file.read())
+def iter_xml_items(file_path):
+    """
+    Yields the Jira issues <item> elements of the XML files one at a time, parsed incrementally.
+    Each item is cleared once processed, so the parsed XML doesn't pile up for large exports
+    (the data gathered from each issue is still kept by the project).
+    """
+    for xml_file in _xml_file_paths(file_path):
+        context = etree.iterparse(xml_file, events=('end',), tag='item', remove_blank_text=True)
+        context.set_element_class_lookup(objectify.ObjectifyElementClassLookup())
+        for _, item in context:
+            parent = item.getparent()
+            if parent is None or parent.tag != 'channel':
+                continue
+            yield item
+            # Release the processed item and the channel elements preceding it
+            item.clear()
+            while item.getprevious() is not None:
+                parent.remove(item.getprevious())
+        del context
 
 
-def read_xml_files(file_path):
-    files = list()
+def _xml_file_paths(file_path):
+    paths = list()
     for file_name in file_path.split(';'):
         if os.path.isdir(file_name):
-            xml_files = glob.glob(file_name + '/*.xml')
-            for file in xml_files:
-                files.append(read_xml_file(file))
+            with os.scandir(file_name) as entries:
+                paths.extend(entry.path for entry in entries if entry.name.endswith('.xml') and entry.is_file())
         else:
-            files.append(read_xml_file(file_name))
+            paths.append(file_name)
 
-    return files
+    return paths
 
 
 # TODO: match a list of project names (ex: JENKINS, INFRA, etc.) instead of just the current one
@@ -149,27 +180,35 @@ def replace_jira_urls_with_redirection_service(project, content):
     if content is None or not project.config.redirection_service:
         return content if content is not None else ''
 
+    pattern = _jira_url_re(project.jiraBaseUrl, project.name)
+
+    # Replace with redirection service URL + issue number + query string (if present)
+    issue_number_and_query = r'\1\2'
+    # TODO: use project name when redirection service allows it to allow multiple projects (ex: JENKINS, INFRA)
+    # replacement = f'{project.config.redirection_service}/{project.name}/{issue_number_and_query}'
+    replacement = f'{project.config.redirection_service}/issue/{issue_number_and_query}'
+
+    return pattern.sub(replacement, content)
+
+
+@lru_cache(maxsize=None)
+def _jira_url_re(jira_base_url, project_name):
+    """
+    Compiles the Jira browse URL pattern once per Jira instance and project, it's applied to every issue and comment body.
+    """
     # Pattern to match any Jira browse URL (with or without https://)
     # Uses negative lookbehind to exclude 'original-jira-link' class links
     # Multiple lookbehinds handle cases with/without protocol in the href attribute
     # Remove protocol from jiraBaseUrl since we'll add an optional one
-    jira_base_without_protocol = project.jiraBaseUrl.replace('https://', '').replace('http://', '')
+    jira_base_without_protocol = jira_base_url.replace('https://', '').replace('http://', '')
     escaped_jira_base_url = jira_base_without_protocol.replace('.', r'\.')
-    pattern = (
+    return re.compile(
         rf'(?<!<a class="original-jira-link" href=")'
         rf'(?<!<a class="original-jira-link" href="https://)'
         rf'(?<!<a class="original-jira-link" href="http://)'
-        rf'(?:https?://)?{escaped_jira_base_url}/browse/{project.name}-(\d+)(\?[^\s<>"]*)?'
+        rf'(?:https?://)?{escaped_jira_base_url}/browse/{project_name}-(\d+)(\?[^\s<>"]*)?'
     )
 
-    # Replace with redirection service URL + issue number + query string (if present)
-    issue_number_and_query = r'\1\2'
-    # TODO: use project name when redirection service allows it to allow multiple projects (ex: JENKINS, INFRA)
-    # replacement = f'{project.config.redirection_service}/{project.name}/{issue_number_and_query}'
-    replacement = f'{project.config.redirection_service}/issue/{issue_number_and_query}'
-
-    return re.sub(pattern, replacement, content)
-
 def get_github_search_or_redirect_url_from_jira_key(project, jira_key):
     """
     Returns the GitHub search URL or redirection service URL for a given Jira key.
@@ -198,19 +237,6 @@ def replace_plain_jira_keys_with_links(project, content):
     if content is None or not project.config.redirection_service:
         return content if content is not None else ''
 
-    # Pattern to match plain text issue key references
-    # Excludes keys already part of URLs or links
-    plain_key_pattern = (
-        rf'(?<!browse/)'  # Not after browse/
-        rf'(?<!href=")'  # Not after href="
-        rf'(?<!\[)'  # Not after [
-        rf'(?<!\()'  # Not after (
-        rf'(?<!>)'  # Not after > (inside HTML tags)
-        rf'\b({project.name}-(\d+))\b'  # Match whole word PROJECT-NUMBER
-        rf'(?!\])'  # Not before ]
-        rf'(?!\))'  # Not before )
-    )
-
     def replace_plain_key(match):
         full_key = match.group(1)
         issue_number = match.group(2)
@@ -222,4 +248,20 @@ def replace_plain_jira_keys_with_links(project, content):
             link_url = f'{project.jiraBaseUrl}/browse/{full_key}'
         return f'<a class="jira-plain-text-key" href="{link_url}">{full_key}</a>'
 
-    return re.sub(plain_key_pattern, replace_plain_key, content)
+    return _plain_jira_key_re(project.name).sub(replace_plain_key, content)
+
+
+@lru_cache(maxsize=None)
+def _plain_jira_key_re(project_name):
+    # Pattern to match plain text issue key references
+    # Excludes keys already part of URLs or links
+    return re.compile(
+        rf'(?<!browse/)'  # Not after browse/
+        rf'(?<!href=")'  # Not after href="
+        rf'(?<!\[)'  # Not after [
+        rf'(?<!\()'  # Not after (
+        rf'(?<!>)'  # Not after > (inside HTML tags)
+        rf'\b({project_name}-(\d+))\b'  # Match whole word PROJECT-NUMBER
+        rf'(?!\])'  # Not before ]
+        rf'(?!\))'  # Not before )
+    )